@@ -36,7 +36,7 @@ def remove_unused_columns(dataset):
 
 def convert_alpaca_vicuna(in_file: str, out_file: str = None):
     raw_dataset = load_dataset('json', data_files=in_file)['train']
-    raw_dataset = raw_dataset.map(extract_default_prompt_dataset)
+    raw_dataset = raw_dataset.map(extract_default_prompt_dataset, batched=True)
 
     collect_data = []
     for i, content in enumerate(raw_dataset):
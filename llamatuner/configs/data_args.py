@@ -87,6 +87,13 @@ class DataArguments:
             'help': 'The number of processes to use for the pre-processing.'
         },
     )
+    shuffle_subset: bool = field(
+        default=True,
+        metadata={
+            'help':
+            'Whether to shuffle before truncating to max samples, so the subset is not biased toward the storage order.'
+        },
+    )
     max_samples: Optional[int] = field(
         default=None,
         metadata={
@@ -116,6 +123,13 @@ class DataArguments:
             'Size of the development set, should be an integer or a float in range `[0,1)`.'
         },
     )
+    pad_to_multiple_of: Optional[int] = field(
+        default=8,
+        metadata={
+            'help':
+            'Round the padded batch length up to a multiple of this value to keep GEMM tiles aligned (e.g. 64 for BF16).'
+        },
+    )
     packing: Optional[bool] = field(
         default=None,
         metadata={
@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import Any, Dict, List, Tuple
 
 import datasets
+import numpy as np
 import torch
 from torch.utils.data import Dataset
 from transformers import PreTrainedTokenizer
@@ -100,7 +101,7 @@ class VicunaDataset(Dataset):
         assert len(input_ids) == len(
             labels), f'{len(input_ids)} != {len(labels)}'
 
-        return torch.tensor(input_ids), torch.tensor(labels)
+        return torch.as_tensor(input_ids), torch.as_tensor(labels)
 
     def _get_human_prefix(self, turn_id: int, role: str) -> str:
         """Get the prefix for a human turn.
@@ -204,9 +205,9 @@ class ConversationDataset(Dataset):
 
         assert len(input_ids) == len(target_mask) == len(labels)
 
-        return (torch.tensor(input_ids, dtype=torch.long),
-                torch.tensor(target_mask, dtype=torch.long),
-                torch.tensor(labels, dtype=torch.long))
+        return (torch.as_tensor(input_ids, dtype=torch.long),
+                torch.as_tensor(target_mask, dtype=torch.long),
+                torch.as_tensor(labels, dtype=torch.long))
 
     def __len__(self) -> int:
         return len(self.raw_data)
@@ -280,9 +281,14 @@ class ConversationDataCollator(object):
             batch_att_masks.append(attention_mask)
             batch_target_masks.append(target_mask)
 
-        batch_input_ids = torch.tensor(batch_input_ids, dtype=torch.long)
-        batch_att_masks = torch.tensor(batch_att_masks, dtype=torch.long)
-        batch_target_masks = torch.tensor(batch_target_masks, dtype=torch.long)
+        # Convert the nested lists through NumPy: torch.tensor walks nested
+        # Python lists element by element, np.asarray + from_numpy does not
+        batch_input_ids = torch.from_numpy(
+            np.asarray(batch_input_ids, dtype=np.int64))
+        batch_att_masks = torch.from_numpy(
+            np.asarray(batch_att_masks, dtype=np.int64))
+        batch_target_masks = torch.from_numpy(
+            np.asarray(batch_target_masks, dtype=np.int64))
 
         return {
             'input_ids': batch_input_ids,
@@ -2,64 +2,90 @@ import argparse
 import logging
 import os
 import random
+import warnings
 from typing import Any, Dict, List, Optional, Tuple, Union
 
-import numpy as np
 import pandas as pd
+import pyarrow as pa
 import torch
-from datasets import Dataset, DatasetDict, concatenate_datasets, load_dataset
+from datasets import (Dataset, DatasetDict, IterableDataset,
+                      IterableDatasetDict, concatenate_datasets,
+                      interleave_datasets, load_dataset)
 from transformers import PreTrainedTokenizer
 
 from llamatuner.data.conv_dataset import ConversationDataset, VicunaDataset
-from llamatuner.data.sft_dataset import (DataCollatorForSupervisedDataset,
-                                         SupervisedDataset)
-from llamatuner.data.template import (ALPACA_PROMPT_DICT, DEFAULT_PROMPT_DICT,
-                                      RANDOM_PROMPT_DICT)
+from llamatuner.data.sft_dataset import (DataCollatorForPackedDataset,
+                                         DataCollatorForSupervisedDataset,
+                                         SupervisedDataset,
+                                         pretokenize_dataset)
+from llamatuner.data.template import (ALPACA_PROMPT_FN, DEFAULT_PROMPT_FN,
+                                      RANDOM_PROMPT_FN)
 
 
-def extract_default_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
-    # Not random, use pre-defined templates
-    if example.get('input', '') != '':
-        prompt_template = DEFAULT_PROMPT_DICT['prompt_input']
-    else:
-        prompt_template = DEFAULT_PROMPT_DICT['prompt_no_input']
+def extract_default_prompt_dataset(
+        batch: Dict[str, List[Any]]) -> Dict[str, List[str]]:
+    """Batched map function that builds prompts with the default templates.
 
-    # Format prompt with example
-    formated_prompt = prompt_template.format(**example)
+    Args:
+        batch: A batch of examples as a dictionary of columns.
 
-    return {'input': formated_prompt}
+    Returns:
+        A dictionary containing the formatted prompt for each example.
+    """
+    # Not random, use pre-defined (pre-compiled) templates
+    prompt_input = DEFAULT_PROMPT_FN['prompt_input']
+    prompt_no_input = DEFAULT_PROMPT_FN['prompt_no_input']
+
+    instructions = batch['instruction']
+    batch_inputs = batch.get('input', [''] * len(instructions))
+
+    # Format prompt with each example
+    formated_prompts = []
+    for instruction, inp in zip(instructions, batch_inputs):
+        if inp != '':
+            formated_prompts.append(prompt_input(instruction, inp))
+        else:
+            formated_prompts.append(prompt_no_input(instruction))
 
+    return {'input': formated_prompts}
 
-def extract_alpaca_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
-    """Extracts input from an example in the Alpaca dataset.
+
+def extract_alpaca_prompt_dataset(
+        batch: Dict[str, List[Any]]) -> Dict[str, List[str]]:
+    """Batched map function that builds prompts with the Alpaca templates.
 
     Args:
-        example: A dictionary containing a single example from the Alpaca dataset.
+        batch: A batch of examples from the Alpaca dataset as a dictionary of columns.
 
     Returns:
-        A dictionary containing the extracted input string from the example.
-
-    Examples:
-        >>> example = {'input': 'example input', 'output': 'example output'}
-        >>> extract_alpaca_dataset(example)
-        {'input': 'example input'}
+        A dictionary containing the formatted prompt for each example.
     """
-    if example.get('input', '') != '':
-        prompt_format = ALPACA_PROMPT_DICT['prompt_input']
-    else:
-        prompt_format = ALPACA_PROMPT_DICT['prompt_no_input']
-    return {'input': prompt_format.format(**example)}
+    prompt_input = ALPACA_PROMPT_FN['prompt_input']
+    prompt_no_input = ALPACA_PROMPT_FN['prompt_no_input']
 
+    instructions = batch['instruction']
+    batch_inputs = batch.get('input', [''] * len(instructions))
 
-def extract_vicuna_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
+    formated_prompts = []
+    for instruction, inp in zip(instructions, batch_inputs):
+        if inp != '':
+            formated_prompts.append(prompt_input(instruction, inp))
+        else:
+            formated_prompts.append(prompt_no_input(instruction))
+
+    return {'input': formated_prompts}
+
+
+def extract_vicuna_prompt_example(
+        conversations: List[Dict[str, str]]) -> Tuple[str, str]:
     """Extracts the input and output portions of a single conversation example
     from the Vicuña format.
 
     Args:
-        example (Dict[str, Any]): A single conversation example in the Vicuña format.
+        conversations (List[Dict[str, str]]): A single conversation in the Vicuña format.
 
     Returns:
-        Dict[str, str]: A dictionary containing the input and output portions of the conversation.
+        Tuple[str, str]: The input and output portions of the conversation.
     """
     # Set default system message
     system = "A chat between a curious user and an artificial intelligence assistant. The assistant gives helpful,\
@@ -74,7 +100,6 @@ def extract_vicuna_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
 
     # Extract messages from conversation
     messages = []
-    conversations = example['conversations']
     if conversations[0]['from'].lower() == 'system':
         # If first message is from system, use it as system message
         system = conversations[0]['value']
@@ -99,29 +124,110 @@ def extract_vicuna_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
     input_str, output_str = ret.rsplit(sep, 1)
     input_str += sep
 
-    return {'input': input_str, 'output': output_str}
+    return input_str, output_str
 
 
-def extract_random_prompt_dataset(example: Dict[str, Any]) -> Dict[str, str]:
+def extract_vicuna_prompt_dataset(
+        batch: Dict[str, List[Any]]) -> Dict[str, List[str]]:
+    """Batched map function that extracts the input and output portions of
+    conversation examples in the Vicuña format.
 
-    random_prompt_input = RANDOM_PROMPT_DICT['prompt_input']
-    random_prompt_without_input = RANDOM_PROMPT_DICT['prompt_no_input']
-    # Randomly choose prompt template
-    if example.get('input', '') != '':
-        # Input exists, choose from prompts with input
-        prompt_template, _ = random.choices(
-            random_prompt_input,
-            weights=[w for _, w in random_prompt_input])[0]
-    else:
-        # No input, choose from prompts without input
-        prompt_template, _ = random.choices(
-            random_prompt_without_input,
-            weights=[w for _, w in random_prompt_without_input])[0]
+    Args:
+        batch: A batch of conversation examples as a dictionary of columns.
+
+    Returns:
+        A dictionary containing the input and output portions of each conversation.
+    """
+    inputs, outputs = [], []
+    for conversations in batch['conversations']:
+        input_str, output_str = extract_vicuna_prompt_example(conversations)
+        inputs.append(input_str)
+        outputs.append(output_str)
+    return {'input': inputs, 'output': outputs}
+
+
+def extract_random_prompt_dataset(
+        batch: Dict[str, List[Any]]) -> Dict[str, List[str]]:
+    """Batched map function that builds prompts with randomly chosen
+    templates.
+
+    Args:
+        batch: A batch of examples as a dictionary of columns.
+
+    Returns:
+        A dictionary containing the formatted prompt for each example.
+    """
+    random_prompt_input = RANDOM_PROMPT_FN['prompt_input']
+    random_prompt_without_input = RANDOM_PROMPT_FN['prompt_no_input']
+    input_weights = [w for _, w in random_prompt_input]
+    no_input_weights = [w for _, w in random_prompt_without_input]
+
+    instructions = batch['instruction']
+    batch_inputs = batch.get('input', [''] * len(instructions))
+
+    formated_prompts = []
+    for instruction, inp in zip(instructions, batch_inputs):
+        # Randomly choose prompt template
+        if inp != '':
+            # Input exists, choose from prompts with input
+            prompt_fn, _ = random.choices(random_prompt_input,
+                                          weights=input_weights)[0]
+            formated_prompts.append(prompt_fn(instruction, inp))
+        else:
+            # No input, choose from prompts without input
+            prompt_fn, _ = random.choices(random_prompt_without_input,
+                                          weights=no_input_weights)[0]
+            formated_prompts.append(prompt_fn(instruction))
+
+    return {'input': formated_prompts}
+
+
+def _read_parquet_cache(cache_path: str, loader) -> Optional[Dataset]:
+    """Read a Parquet cache file, returning None when it is unreadable.
+
+    A torn write from a crashed or concurrent run can leave a partial file
+    behind; in that case the caller falls back to re-parsing the original
+    text file instead of failing the run.
+
+    Args:
+        cache_path (str): Path of the Parquet cache file.
+        loader: Callable turning the cache path into a dataset.
+    """
+    try:
+        return loader(cache_path)
+    except Exception as err:  # noqa: BLE001 - any cache failure is recoverable
+        warnings.warn(
+            f'Discarding unreadable Parquet cache {cache_path} ({err}); '
+            're-parsing the source file.')
+        return None
 
-    # Format prompt with example
-    formated_prompt = prompt_template.format(**example)
 
-    return {'input': formated_prompt}
+def _write_parquet_cache(dataset: Dataset, cache_path: str) -> None:
+    """Write a Parquet cache next to the source file, best effort.
+
+    The write goes through a per-process temp file followed by an atomic
+    `os.replace`, so concurrent ranks under torchrun/deepspeed can never
+    leave a torn cache behind, and only the local main process writes at
+    all. Failures (e.g. a read-only dataset directory) are downgraded to a
+    warning: the cache is an optimization, not a requirement.
+
+    Args:
+        dataset (Dataset): The materialized dataset to cache.
+        cache_path (str): Destination path of the Parquet cache file.
+    """
+    if int(os.environ.get('LOCAL_RANK', '0')) != 0:
+        return
+    tmp_path = f'{cache_path}.tmp.{os.getpid()}'
+    try:
+        dataset.to_parquet(tmp_path, compression='zstd')
+        os.replace(tmp_path, cache_path)
+    except Exception as err:  # noqa: BLE001 - caching must never fail the run
+        warnings.warn(f'Could not write Parquet cache {cache_path}: {err}')
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 
 def load_local_dataset(
@@ -141,16 +247,41 @@ def load_local_dataset(
         ValueError: If the specified file format is unsupported.
     """
 
+    # Parsing CSV/JSON from text on every launch is orders of magnitude slower
+    # than reading Arrow-backed Parquet, which is also memory-mapped on demand
+    # instead of loaded into RAM. Materialize a Parquet cache next to the
+    # source file on first load and reuse it while it is newer than the source.
+    cache_path = dataset_path + '.parquet'
+    cache_hit = os.path.exists(cache_path) and os.path.getmtime(
+        cache_path) >= os.path.getmtime(dataset_path)
+
     # Read in the full dataset from file based on the file format
-    if dataset_path.endswith('.json'):
-        full_dataset = load_dataset('json', data_files=dataset_path)
-    elif dataset_path.endswith('.jsonl'):
-        full_dataset = load_dataset('json', data_files=dataset_path)
+    if dataset_path.endswith('.json') or dataset_path.endswith('.jsonl'):
+        full_dataset = None
+        if cache_hit:
+            full_dataset = _read_parquet_cache(
+                cache_path, lambda path: load_dataset('parquet',
+                                                      data_files=path))
+        if full_dataset is None:
+            full_dataset = load_dataset('json', data_files=dataset_path)
+            _write_parquet_cache(full_dataset['train'], cache_path)
     elif dataset_path.endswith('.csv'):
-        full_dataset = Dataset.from_pandas(pd.read_csv(dataset_path))
+        full_dataset = None
+        if cache_hit:
+            full_dataset = _read_parquet_cache(cache_path,
+                                               Dataset.from_parquet)
+        if full_dataset is None:
+            full_dataset = Dataset.from_pandas(pd.read_csv(dataset_path))
+            _write_parquet_cache(full_dataset, cache_path)
     elif dataset_path.endswith('.tsv'):
-        full_dataset = Dataset.from_pandas(
-            pd.read_csv(dataset_path, delimiter='\t'))
+        full_dataset = None
+        if cache_hit:
+            full_dataset = _read_parquet_cache(cache_path,
+                                               Dataset.from_parquet)
+        if full_dataset is None:
+            full_dataset = Dataset.from_pandas(
+                pd.read_csv(dataset_path, delimiter='\t'))
+            _write_parquet_cache(full_dataset, cache_path)
     else:
         raise ValueError(f'Unsupported dataset format: {dataset_path}')
     if 'train' not in full_dataset:
@@ -165,6 +296,7 @@ def load_data(
     dataset_path: str,
     eval_dataset_size: float = 0.1,
     text_logger: logging.Logger = None,
+    streaming: bool = False,
 ) -> Union[Dict[str, Dataset], None]:
     """Load a dataset based on its name.
 
@@ -172,6 +304,8 @@ def load_data(
         dataset_path: A string representing the path to the dataset to be loaded.
         eval_dataset_size: A float representing the size of the evaluation dataset.
         text_logger: A logger object to log messages.
+        streaming: If True, load the dataset lazily as an `IterableDataset`
+            instead of materializing it in memory.
 
     Returns:
         A dictionary containing the loaded dataset if the dataset exists.
@@ -191,17 +325,32 @@ def load_data(
             f'Lodding dataset from huggingface, please ref to https://huggingface.co/datasets/{dataset_path}'
         )
         dataset = load_dataset(dataset_path,
-                               cache_dir='~/.cache/huggingface/datasets')
+                               cache_dir='~/.cache/huggingface/datasets',
+                               download_mode='reuse_dataset_if_exists',
+                               streaming=streaming)
         return dataset
     else:
         # Load dataset from local file
         try:
             text_logger.info(
                 f'Lodding dataset from local path: {dataset_path}')
+            if streaming and (dataset_path.endswith('.json')
+                              or dataset_path.endswith('.jsonl')):
+                # Stream local (ND)JSON lazily, no Arrow cache materialization
+                return load_dataset('json',
+                                    data_files=dataset_path,
+                                    streaming=True)
+            if streaming:
+                text_logger.warning(
+                    f'Streaming is not supported for {dataset_path}, falling back to an in-memory load.'
+                )
             dataset = load_local_dataset(dataset_path, eval_dataset_size)
             return dataset
-        except:
-            raise ValueError(f'Error loading dataset from {dataset_path}')
+        except (FileNotFoundError, ValueError, pa.ArrowInvalid) as err:
+            # Only wrap the expected parse/read failures; anything else
+            # (e.g. schema bugs downstream) should surface unmasked.
+            raise ValueError(
+                f'Error loading dataset from {dataset_path}') from err
 
 
 def formate_instruction_dataset(
@@ -239,12 +388,18 @@ def formate_instruction_dataset(
 
     def _format_chip2(dataset: Dataset) -> Dataset:
         """Format CHIP-2 dataset."""
-        dataset = dataset.map(
-            lambda x: {
-                'input': x['text'].split('\n<bot>: ')[0].replace(
-                    '<human>: ', ''),
-                'output': x['text'].split('\n<bot>: ')[1]
-            })
+
+        def _chip2_batch(batch: Dict[str, List[str]]) -> Dict[str, List[str]]:
+            # Split each text once with partition instead of scanning it
+            # twice, and only strip the leading '<human>: ' marker.
+            inputs, outputs = [], []
+            for text in batch['text']:
+                head, _, tail = text.partition('\n<bot>: ')
+                inputs.append(head.replace('<human>: ', '', 1))
+                outputs.append(tail)
+            return {'input': inputs, 'output': outputs}
+
+        dataset = dataset.map(_chip2_batch, **map_kwargs)
         return dataset
 
     def _format_self_instruct(dataset: Dataset) -> Dataset:
@@ -258,12 +413,24 @@ def formate_instruction_dataset(
 
     def _format_hh_rlhf(dataset: Dataset) -> Dataset:
         """Format HH-RLHF dataset."""
-        dataset = dataset.map(lambda x: {'input': '', 'output': x['chosen']})
+        dataset = dataset.map(
+            lambda batch: {
+                'input': [''] * len(batch['chosen']),
+                'output': batch['chosen'],
+            },
+            **map_kwargs,
+        )
         return dataset
 
     def _format_oasst1(dataset: Dataset) -> Dataset:
         """Format OASST1 dataset."""
-        dataset = dataset.map(lambda x: {'input': '', 'output': x['text']})
+        dataset = dataset.map(
+            lambda batch: {
+                'input': [''] * len(batch['text']),
+                'output': batch['text'],
+            },
+            **map_kwargs,
+        )
         return dataset
 
     def _format_100Poison(dataset: Dataset) -> Dataset:
@@ -274,12 +441,25 @@ def formate_instruction_dataset(
 
     def _remove_unused_columns(dataset):
         """Remove columns not named 'input' or 'output'."""
-        dataset = dataset.remove_columns([
-            col for col in dataset.column_names['train']
-            if col not in ['input', 'output']
-        ])
+        column_names = (dataset.column_names['train'] if isinstance(
+            dataset, (DatasetDict, IterableDatasetDict)) else
+                        dataset.column_names)
+        if column_names is None:
+            # Streaming datasets may not expose their schema before iteration.
+            return dataset
+        dataset = dataset.remove_columns(
+            [col for col in column_names if col not in ['input', 'output']])
         return dataset
 
+    # Run the map transforms batched across all cores: the per-example Python
+    # overhead amortizes over each batch and the Arrow fingerprint cache can
+    # reuse the result on re-runs. Streaming datasets are mapped lazily in
+    # the main process since their map() does not accept num_proc.
+    if isinstance(dataset, (IterableDataset, IterableDatasetDict)):
+        map_kwargs = {'batched': True}
+    else:
+        map_kwargs = {'batched': True, 'num_proc': os.cpu_count()}
+
     # Format dataset
     text_logger.info(
         f'Original {dataset_name} using {dataset_format} dataset format.')
@@ -306,11 +486,11 @@ def formate_instruction_dataset(
     # encode_instruction_example
     text_logger.info(f'Applying instruction template: {instruction_template}')
     if instruction_template == 'alpaca':
-        dataset = dataset.map(extract_alpaca_prompt_dataset)
+        dataset = dataset.map(extract_alpaca_prompt_dataset, **map_kwargs)
     elif instruction_template == 'random':
-        dataset = dataset.map(extract_random_prompt_dataset)
+        dataset = dataset.map(extract_random_prompt_dataset, **map_kwargs)
     else:
-        dataset = dataset.map(extract_default_prompt_dataset)
+        dataset = dataset.map(extract_default_prompt_dataset, **map_kwargs)
 
     # Remove unused columns.
     text_logger.info(
@@ -327,6 +507,7 @@ def split_train_eval(
     max_eval_samples: int = None,
     do_train: bool = True,
     max_train_samples: int = None,
+    shuffle_subset: bool = True,
     text_logger: logging.Logger = None,
 ) -> Dict[str, Dataset]:
     """Prepare the training and evaluation datasets for a machine learning
@@ -342,12 +523,40 @@ def split_train_eval(
         do_train (bool, optional): Whether to use a training dataset or not. Defaults to True.
         max_train_samples (int, optional): The maximum number of samples to keep in the training dataset.
             Ignored if `do_train` is False or `None`. Defaults to None.
+        shuffle_subset (bool, optional): Whether to shuffle before selecting a subset, so the
+            subset is not biased toward the storage order. Set to False when the dataset is
+            known to be shuffled already. Defaults to True.
         text_logger (logging.Logger, optional): A logger object to log messages. Defaults to None.
 
     Returns:
         Dict[str, Dataset]: A dictionary containing the prepared training and evaluation datasets
         (if used), where the keys are 'train' and 'eval', respectively.
     """
+    if isinstance(dataset, (IterableDataset, IterableDatasetDict)):
+        # Streaming pipelines cannot be indexed or length-checked, so carve
+        # the splits lazily with take()/skip() instead of train_test_split.
+        train_stream = dataset['train'] if isinstance(
+            dataset, IterableDatasetDict) else dataset
+        eval_stream = dataset['eval'] if (isinstance(
+            dataset, IterableDatasetDict) and 'eval' in dataset) else None
+
+        train_dataset, eval_dataset = None, None
+        if do_eval:
+            if eval_stream is None:
+                text_logger.info(
+                    f'Taking the first {int(eval_dataset_size)} streamed examples for validation.'
+                )
+                eval_stream = train_stream.take(int(eval_dataset_size))
+                train_stream = train_stream.skip(int(eval_dataset_size))
+            eval_dataset = eval_stream
+            if max_eval_samples is not None:
+                eval_dataset = eval_dataset.take(max_eval_samples)
+        if do_train:
+            train_dataset = train_stream
+            if max_train_samples is not None:
+                train_dataset = train_dataset.take(max_train_samples)
+        return train_dataset, eval_dataset
+
     if not isinstance(dataset, DatasetDict):
         raise TypeError("The 'dataset' argument must be a DatasetDict object.")
 
@@ -371,7 +580,12 @@ def split_train_eval(
         )
         if max_eval_samples is not None and len(
                 eval_dataset) > max_eval_samples:
-            eval_dataset = eval_dataset.select(np.arange(max_eval_samples))
+            if shuffle_subset:
+                # Shuffle before selecting so the subset is not biased toward
+                # the upload order; flatten_indices materializes a contiguous
+                # Arrow slice so later iteration avoids per-row indirection.
+                eval_dataset = eval_dataset.shuffle(seed=42).flatten_indices()
+            eval_dataset = eval_dataset.select(range(max_eval_samples))
 
     # Prepare training dataset
     if do_train:
@@ -383,7 +597,10 @@ def split_train_eval(
         )
         if max_train_samples is not None and len(
                 train_dataset) > max_train_samples:
-            train_dataset = train_dataset.select(np.arange(max_train_samples))
+            if shuffle_subset:
+                train_dataset = train_dataset.shuffle(
+                    seed=42).flatten_indices()
+            train_dataset = train_dataset.select(range(max_train_samples))
 
     return train_dataset, eval_dataset
 
@@ -430,6 +647,7 @@ def make_data_module(args, text_logger):
             dataset_path,
             eval_dataset_size=args.eval_dataset_size,
             text_logger=text_logger,
+            streaming=getattr(args, 'streaming', False),
         )
 
         if not dataset_attr.multi_turn:
@@ -448,6 +666,7 @@ def make_data_module(args, text_logger):
             max_eval_samples=args.max_eval_samples,
             do_train=args.do_train,
             max_train_samples=args.max_train_samples,
+            shuffle_subset=getattr(args, 'shuffle_subset', True),
             text_logger=text_logger,
         )
         if train_dataset:
@@ -455,19 +674,48 @@ def make_data_module(args, text_logger):
         if eval_dataset:
             eval_datasets.append(eval_dataset)
 
-    concate_train = concatenate_datasets(
-        train_datasets) if train_datasets else None
-    concate_eval = concatenate_datasets(
-        eval_datasets) if eval_datasets else None
-
-    result_train = (
-        f'Concatenated dataset list: {dataset_name_list}, #train dataset size: {len(concate_train)}'
-        if concate_train else None)
-    result_eval = (
-        f'Concatenated dataset list: {dataset_name_list}, #eval dataset size: {len(concate_eval)}'
-        if concate_eval else None)
-    text_logger.info(result_train)
-    text_logger.info(result_eval)
+    def _merge_datasets(dataset_list: List[Dataset]) -> Optional[Dataset]:
+        """Merge datasets according to `args.mix_strategy` (same knobs as the
+        newer pipeline): plain concatenation, or weighted interleaving that
+        draws samples round-robin without materializing the union."""
+        if not dataset_list:
+            return None
+        if len(dataset_list) == 1:
+            return dataset_list[0]
+        mix_strategy = getattr(args, 'mix_strategy', 'concat')
+        if mix_strategy == 'concat':
+            return concatenate_datasets(dataset_list)
+        if mix_strategy.startswith('interleave'):
+            interleave_probs = getattr(args, 'interleave_probs', None)
+            if isinstance(interleave_probs, str):
+                interleave_probs = [
+                    float(prob) for prob in interleave_probs.split(',')
+                ]
+            return interleave_datasets(
+                dataset_list,
+                probabilities=interleave_probs,
+                seed=getattr(args, 'seed', 42),
+                stopping_strategy='first_exhausted'
+                if mix_strategy.endswith('under') else 'all_exhausted',
+            )
+        raise ValueError(f'Unknown mixing strategy: {mix_strategy}')
+
+    concate_train = _merge_datasets(train_datasets)
+    concate_eval = _merge_datasets(eval_datasets)
+
+    if getattr(args, 'streaming', False):
+        # Streamed datasets have no length until iterated.
+        text_logger.info(
+            f'Concatenated streamed dataset list: {dataset_name_list}')
+    else:
+        result_train = (
+            f'Concatenated dataset list: {dataset_name_list}, #train dataset size: {len(concate_train)}'
+            if concate_train else None)
+        result_eval = (
+            f'Concatenated dataset list: {dataset_name_list}, #eval dataset size: {len(concate_eval)}'
+            if concate_eval else None)
+        text_logger.info(result_train)
+        text_logger.info(result_eval)
     return concate_train, concate_eval, mutliturn_lst[0]
 
 
@@ -476,13 +724,44 @@ def make_supervised_data_module(
     args: argparse.Namespace,
     text_logger: logging.Logger,
 ) -> dict[str, torch.utils.data.Dataset]:
+    if getattr(args, 'streaming', False):
+        # The map-style wrappers below need len() and integer indexing, and
+        # pretokenize_dataset needs a materialized Arrow table; fail with a
+        # clear message instead of an opaque TypeError downstream.
+        raise ValueError(
+            'make_supervised_data_module does not support `streaming`: '
+            'SupervisedDataset/ConversationDataset are map-style datasets. '
+            'Consume the streamed dataset from make_data_module directly, '
+            'or disable streaming.')
     train_dataset, eval_dataset, multi_turn = make_data_module(
         args, text_logger)
     max_seq_length = tokenizer.model_max_length
     dataset_cls = (VicunaDataset if args.conversation_template == 'vicnua' else
                    ConversationDataset)
 
-    if not multi_turn:
+    tokenized_path = getattr(args, 'tokenized_path', None)
+    if not multi_turn and tokenized_path is not None:
+        # Tokenize once (cached on disk below `tokenized_path`) and train
+        # from the token-only Arrow table instead of re-tokenizing per epoch.
+        train_dataset = (pretokenize_dataset(
+            train_dataset,
+            tokenizer=tokenizer,
+            max_seq_len=max_seq_length,
+            train_on_source=getattr(args, 'train_on_source', False),
+            num_proc=getattr(args, 'preprocessing_num_workers', None),
+            cache_dir=os.path.join(tokenized_path, 'train'),
+        ) if args.do_train else None)
+
+        eval_dataset = (pretokenize_dataset(
+            eval_dataset,
+            tokenizer=tokenizer,
+            max_seq_len=max_seq_length,
+            train_on_source=getattr(args, 'train_on_source', False),
+            num_proc=getattr(args, 'preprocessing_num_workers', None),
+            cache_dir=os.path.join(tokenized_path, 'eval'),
+        ) if args.do_eval else None)
+
+    elif not multi_turn:
         train_dataset = (SupervisedDataset(
             train_dataset,
             tokenizer=tokenizer,
@@ -515,8 +794,16 @@ def make_supervised_data_module(
         eval_info = f'eval_dataset: {type(eval_dataset)}, mutlti-turn: {multi_turn}, #length: {len(eval_dataset)}'
         text_logger.info(eval_info)
 
-    data_collator = DataCollatorForSupervisedDataset(
-        tokenizer=tokenizer, predict_with_generate=args.predict_with_generate)
+    if getattr(args, 'packing', None) and not multi_turn:
+        # Packed layout for models patched with a varlen attention kernel;
+        # skips the pad-position FLOPs of the rectangular batch entirely.
+        data_collator = DataCollatorForPackedDataset(tokenizer=tokenizer)
+    else:
+        data_collator = DataCollatorForSupervisedDataset(
+            tokenizer=tokenizer,
+            predict_with_generate=args.predict_with_generate,
+            pad_to_multiple_of=getattr(args, 'pad_to_multiple_of', 8),
+        )
 
     return {
         'train_dataset': train_dataset,
@@ -1,16 +1,91 @@
-import copy
+import hashlib
+import os
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import numpy as np
 import torch
-from datasets import DatasetDict
-from torch.nn.utils.rnn import pad_sequence
+from datasets import DatasetDict, load_from_disk
 from torch.utils.data import Dataset
 from transformers.tokenization_utils import PreTrainedTokenizer
 
 from llamatuner.utils.constants import IGNORE_INDEX
 
 
+def pretokenize_dataset(
+    raw_data: Dataset,
+    tokenizer: PreTrainedTokenizer,
+    max_seq_len: int = 1024,
+    train_on_source: bool = False,
+    num_proc: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> Dataset:
+    """Tokenize a raw `input`/`output` dataset once and keep only the token
+    ids as Arrow columns, so the training hot path never re-runs the
+    tokenizer and the collator reduces to padding and stacking.
+
+    Args:
+        raw_data: Raw dataset containing 'input' and 'output' columns.
+        tokenizer: Tokenizer to encode text.
+        max_seq_len: Max sequence length for truncation.
+        train_on_source: If True, compute the loss on the source tokens too.
+        num_proc: Number of tokenizer worker processes. Defaults to all cores.
+        cache_dir: If set, the tokenized dataset is saved below this directory
+            and reloaded on later runs. The cache key covers the tokenizer,
+            the length limits and the dataset fingerprint, so changing any of
+            them invalidates the cache.
+
+    Returns:
+        A dataset with 'input_ids' and 'labels' columns.
+    """
+    cache_path = None
+    if cache_dir is not None:
+        cache_key = hashlib.sha1('-'.join([
+            tokenizer.name_or_path,
+            str(max_seq_len),
+            str(train_on_source),
+            str(getattr(raw_data, '_fingerprint', '')),
+        ]).encode('utf-8')).hexdigest()[:16]
+        cache_path = os.path.join(cache_dir, cache_key)
+        if os.path.isdir(cache_path):
+            return load_from_disk(cache_path)
+
+    bos_token = tokenizer.bos_token
+    eos_token = tokenizer.eos_token
+
+    def _tokenize_batch(batch: Dict[str, List[str]]) -> Dict[str, List[int]]:
+        sources = [bos_token + inp for inp in batch['input']]
+        targets = [out + eos_token for out in batch['output']]
+        tokenized_sources = tokenizer(sources,
+                                      max_length=max_seq_len,
+                                      truncation=True,
+                                      add_special_tokens=False)
+        tokenized_targets = tokenizer(targets,
+                                      max_length=max_seq_len,
+                                      truncation=True,
+                                      add_special_tokens=False)
+        input_ids, labels = [], []
+        for source_ids, target_ids in zip(tokenized_sources['input_ids'],
+                                          tokenized_targets['input_ids']):
+            input_ids.append(source_ids + target_ids)
+            if train_on_source:
+                labels.append(source_ids + target_ids)
+            else:
+                labels.append([IGNORE_INDEX] * len(source_ids) + target_ids)
+        return {'input_ids': input_ids, 'labels': labels}
+
+    tokenized = raw_data.map(
+        _tokenize_batch,
+        batched=True,
+        num_proc=num_proc or os.cpu_count(),
+        remove_columns=raw_data.column_names,
+        desc='Pre-tokenizing dataset',
+    )
+    if cache_path is not None:
+        tokenized.save_to_disk(cache_path)
+    return tokenized
+
+
 @dataclass
 class SupervisedDataset(Dataset):
     """Dataset for supervised fine-tuning of instruction following models.
@@ -43,8 +118,21 @@ class SupervisedDataset(Dataset):
         """
         super(SupervisedDataset, self).__init__()
 
+        if not tokenizer.is_fast:
+            raise ValueError(
+                'SupervisedDataset requires a fast (Rust) tokenizer, which '
+                'releases the GIL and encodes batched inputs in parallel. '
+                'Please pass `use_fast=True` to `AutoTokenizer.from_pretrained`.'
+            )
+        # Padding is done in the collator on purpose, silence the warning
+        tokenizer.deprecation_warnings['Asking-to-pad-a-fast-tokenizer'] = True
+
         self.dataset = raw_data
         self.tokenizer = tokenizer
+        # Hoist the special tokens once instead of re-resolving the tokenizer
+        # attributes for every example
+        self.bos_token = tokenizer.bos_token
+        self.eos_token = tokenizer.eos_token
         self.max_seq_len = max_seq_len
         self.train_on_source = train_on_source
         self.predict_with_generate = predict_with_generate
@@ -65,22 +153,17 @@ class SupervisedDataset(Dataset):
         """
 
         example = self.dataset[idx]
-        source_text = f"{self.tokenizer.bos_token}{example['input']}"
-        target_text = f"{example['output']}{self.tokenizer.eos_token}"
-
-        # Tokenize the source text
-        tokenized_source = self.tokenizer(source_text,
-                                          max_length=self.max_seq_len,
-                                          truncation=True,
-                                          add_special_tokens=False)
-        # Tokenize the target text
-        tokenized_target = self.tokenizer(target_text,
-                                          max_length=self.max_seq_len,
-                                          truncation=True,
-                                          add_special_tokens=False)
-
-        source_ids = tokenized_source['input_ids']
-        target_ids = tokenized_target['input_ids']
+        source_text = self.bos_token + example['input']
+        target_text = example['output'] + self.eos_token
+
+        # Tokenize source and target in one fused call instead of two
+        # sequential ones, so fast tokenizers encode both in a single pass
+        tokenized = self.tokenizer([source_text, target_text],
+                                   max_length=self.max_seq_len,
+                                   truncation=True,
+                                   add_special_tokens=False)
+
+        source_ids, target_ids = tokenized['input_ids']
 
         # Extract the input_ids tensor
         if len(source_ids) > self.max_seq_len:
@@ -93,21 +176,28 @@ class SupervisedDataset(Dataset):
                 f'Target length {len(target_ids)} exceeds max seq length of {self.max_seq_len}'
             )
         if not self.predict_with_generate:
-            # If not generating predictions, concatenate the input and target ids
-            input_ids = torch.tensor(source_ids + target_ids)
+            # Concatenate input and target ids at the NumPy level and share
+            # the resulting buffers with torch instead of building Python
+            # lists and converting them element by element
+            source_ids = np.asarray(source_ids, dtype=np.int64)
+            target_ids = np.asarray(target_ids, dtype=np.int64)
+            input_ids = torch.from_numpy(
+                np.concatenate((source_ids, target_ids)))
             if not self.train_on_source:
                 # If not training on the source text, set the labels to IGNORE_INDEX \
                 # for the input ids and the target ids
-                labels = torch.tensor(
-                    [IGNORE_INDEX for _ in range(len(source_ids))] +
-                    copy.deepcopy(target_ids))
+                labels = np.concatenate((np.full(
+                    len(source_ids), IGNORE_INDEX, dtype=np.int64),
+                                         target_ids))
             else:
                 # If training on the source text, set the labels to the concatenated \
                 # input and target ids
-                labels = torch.tensor(copy.deepcopy(source_ids + target_ids))
+                labels = np.concatenate((source_ids, target_ids))
+            labels = torch.from_numpy(labels)
         else:
             # If generating predictions, only use the source ids as input
-            input_ids = torch.tensor(source_ids)
+            input_ids = torch.from_numpy(np.asarray(source_ids,
+                                                    dtype=np.int64))
             labels = None
 
         # Construct data dictionary containing inputs and labels
@@ -116,12 +206,65 @@ class SupervisedDataset(Dataset):
         return data_dict
 
 
+@dataclass
+class DataCollatorForPackedDataset:
+    """Collate examples into one packed sequence with cumulative sequence
+    lengths instead of a padded rectangle.
+
+    Packing removes the attention FLOPs and memory traffic that a padded
+    batch spends on pad positions. The model must consume the emitted
+    `cu_seqlens`/`max_seqlen` through a variable-length attention kernel
+    (e.g. flash_attn_varlen_func); stock HF models expect padded input, so
+    this collator is only wired up when `args.packing` is set.
+    """
+
+    tokenizer: PreTrainedTokenizer
+
+    def __call__(
+            self,
+            examples: List[Dict[str,
+                                torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        """Pack examples into a single concatenated sequence.
+
+        Args:
+            examples: List of examples, each containing 'input_ids' and 'labels'
+
+        Returns:
+            Dictionary with packed 'input_ids' and 'labels' of shape
+            (1, total_tokens), plus 'cu_seqlens' boundaries and 'max_seqlen'
+            for the varlen attention kernel.
+        """
+        input_ids = [np.asarray(example['input_ids']) for example in examples]
+        labels = [np.asarray(example['labels']) for example in examples]
+
+        lengths = np.fromiter((len(ids) for ids in input_ids),
+                              dtype=np.int32,
+                              count=len(input_ids))
+        cu_seqlens = np.zeros(len(input_ids) + 1, dtype=np.int32)
+        np.cumsum(lengths, out=cu_seqlens[1:])
+
+        return {
+            'input_ids': torch.from_numpy(np.concatenate(input_ids))[None, :],
+            'labels': torch.from_numpy(np.concatenate(labels))[None, :],
+            'cu_seqlens': torch.from_numpy(cu_seqlens),
+            'max_seqlen': int(lengths.max()),
+        }
+
+
 @dataclass
 class DataCollatorForSupervisedDataset:
-    """Collate and pad examples for supervised training."""
+    """Collate and pad examples for supervised training.
+
+    Attributes:
+        tokenizer: Tokenizer providing the padding token.
+        predict_with_generate: If True, omit labels from the batch.
+        pad_to_multiple_of: If set, round the padded length up to a multiple
+            of this value so GEMM tiles stay aligned on tensor cores.
+    """
 
     tokenizer: PreTrainedTokenizer
     predict_with_generate: bool = False
+    pad_to_multiple_of: Optional[int] = None
 
     def __call__(
             self,
@@ -136,27 +279,43 @@ class DataCollatorForSupervisedDataset:
             Dictionary with padded 'input_ids', 'attention_mask' and optionally 'labels'
         """
 
-        # Extract input_ids and labels
+        # Extract input_ids and compute per-example lengths
         input_ids = [example['input_ids'] for example in examples]
-        labels = [example['labels'] for example in examples]
+        batch_size = len(input_ids)
+        lengths = np.fromiter((len(ids) for ids in input_ids),
+                              dtype=np.int64,
+                              count=batch_size)
+        max_len = int(lengths.max())
+        if self.pad_to_multiple_of is not None:
+            multiple = self.pad_to_multiple_of
+            max_len = ((max_len + multiple - 1) // multiple) * multiple
 
-        # Pad input sequences
-        input_ids = pad_sequence(input_ids,
-                                 batch_first=True,
-                                 padding_value=self.tokenizer.pad_token_id)
+        # Preallocate the padded buffer once and fill each row with a
+        # C-level slice assignment instead of re-copying via pad_sequence
+        pad_token_id = self.tokenizer.pad_token_id
+        batch_input_ids = np.full((batch_size, max_len),
+                                  pad_token_id,
+                                  dtype=np.int64)
+        for i, ids in enumerate(input_ids):
+            batch_input_ids[i, :lengths[i]] = ids
 
-        # Pad labels if needed
-        if not self.predict_with_generate:
-            labels = pad_sequence(labels,
-                                  batch_first=True,
-                                  padding_value=IGNORE_INDEX)
+        # Create attention mask with a single vectorized comparison
+        attention_mask = batch_input_ids != pad_token_id
 
-        # Create attention mask based on padded input
-        attention_mask = input_ids.ne(self.tokenizer.pad_token_id)
+        # Assemble final dict, sharing the NumPy buffers with torch (zero-copy)
+        data_dict = {
+            'input_ids': torch.from_numpy(batch_input_ids),
+            'attention_mask': torch.from_numpy(attention_mask),
+        }
 
-        # Assemble final dict
-        data_dict = {'input_ids': input_ids, 'attention_mask': attention_mask}
-        if labels is not None:
-            data_dict['labels'] = labels
+        # Pad labels if needed
+        if not self.predict_with_generate:
+            batch_labels = np.full((batch_size, max_len),
+                                   IGNORE_INDEX,
+                                   dtype=np.int64)
+            for i, example in enumerate(examples):
+                labels = example['labels']
+                batch_labels[i, :len(labels)] = labels
+            data_dict['labels'] = torch.from_numpy(batch_labels)
 
         return data_dict
@@ -7,6 +7,7 @@ import evaluate
 import numpy as np
 import torch
 from datasets import load_dataset
+from torch.utils.data import DataLoader
 from tqdm.auto import tqdm
 from transformers import (PreTrainedModel, PreTrainedTokenizer, Trainer,
                           TrainerCallback)
@@ -49,7 +50,6 @@ class MMLUEvalCallback(TrainerCallback):
                     os.path.join(data_dir, 'mmlu/zero_shot_mmlu_test.json'),
                 },
             )
-            mmlu_dataset = mmlu_dataset.remove_columns('subject')
         #  MMLU Five-shot (Eval/Test only)
         elif args.mmlu_dataset in ['mmlu', 'mmlu-fs']:
             mmlu_dataset = load_dataset(
@@ -79,13 +79,18 @@ class MMLUEvalCallback(TrainerCallback):
             tokenizer('C', add_special_tokens=False).input_ids[0],
             tokenizer('D', add_special_tokens=False).input_ids[0],
         ]
+        # Keep a tensor copy ready for the batched logits gather during
+        # evaluation; it is moved to the model device once per eval.
+        self.abcd_idx_tensor = torch.as_tensor(self.abcd_idx)
         # Load the accuracy metric for evaluating MMLU performance.
         self.accuracy = evaluate.load('accuracy')
+        # Capture the subject of every example before the dataset is wrapped:
+        # SupervisedDataset only supports integer indexing.
+        self.mmlu_subjects = self.mmlu_dataset['subject']
         self.mmlu_dataset = SupervisedDataset(
             self.mmlu_dataset,
             tokenizer=tokenizer,
-            source_max_len=args.mmlu_source_max_len,
-            target_max_len=args.target_max_len,
+            max_seq_len=args.mmlu_source_max_len + args.target_max_len,
             train_on_source=args.train_on_source,
             predict_with_generate=args.predict_with_generate,
         )
@@ -107,39 +112,71 @@ class MMLUEvalCallback(TrainerCallback):
             control (Dict[str, Any]): Dictionary containing the evaluation control variables.
             model (PreTrainedModel): The model being evaluated.
         """
-        # Get the evaluation data loader and set the maximum length of the source sequence.
-
-        data_loader = self.trainer.get_eval_dataloader(self.mmlu_dataset)
+        # Build the MMLU data loader directly instead of going through
+        # trainer.get_eval_dataloader: background workers with pinned memory
+        # and prefetching keep the GPU fed, and mutating trainer.args here
+        # would leak these settings (and, with persistent workers, a cached
+        # MMLU loader) into the trainer's own evaluation loop.
+        data_loader = DataLoader(
+            self.mmlu_dataset,
+            batch_size=self.trainer.args.eval_batch_size,
+            collate_fn=self.trainer.data_collator,
+            num_workers=max(self.trainer.args.dataloader_num_workers, 2),
+            pin_memory=True,
+            prefetch_factor=2,
+        )
 
         # Set the trainer model in evaluation mode and initialize empty lists for predictions and references.
         self.trainer.model.eval()
+        abcd_idx = self.abcd_idx_tensor.to(self.trainer.model.device)
         preds, refs = [], []
-        loss_mmlu = 0
+        # Accumulate the loss on device; a .item() here would force a
+        # device-to-host sync on every batch.
+        loss_mmlu = torch.zeros((), device=self.trainer.model.device)
 
         # Iterate over the batches of the evaluation dataset and make predictions.
-        for batch in tqdm(data_loader, total=len(data_loader)):
-            (loss, logits, labels) = self.trainer.prediction_step(
-                self.trainer.model,
-                batch,
-                prediction_loss_only=False,
-            )
-
-            # Extract the predictions for A, B, C, and D tokens.
-            for i, logit in enumerate(logits):
-                label_non_zero_id = (batch['labels'][i] !=
-                                     IGNORE_INDEX).nonzero()[0][0]
-
-                logit_abcd = logit[label_non_zero_id - 1][self.abcd_idx]
-                preds.append(torch.argmax(logit_abcd).item())
-
-            # Extract the ground truth labels and compute the accuracy by subject.
-            labels = labels[labels != IGNORE_INDEX].view(-1, 2)[:, 0]
-            refs += [self.abcd_idx.index(label) for label in labels.tolist()]
-            loss_mmlu += loss.item()
+        # Logits-only eval needs no autograd bookkeeping, so run the loop in
+        # inference mode, with BF16 autocast on CUDA for matmul throughput.
+        with torch.inference_mode(), torch.autocast(
+                'cuda',
+                dtype=torch.bfloat16,
+                enabled=torch.cuda.is_available()):
+            for batch in tqdm(data_loader, total=len(data_loader)):
+                (loss, logits, labels) = self.trainer.prediction_step(
+                    self.trainer.model,
+                    batch,
+                    prediction_loss_only=False,
+                )
+
+                # Locate the position right before the first target token of every
+                # example at once (argmax on a bool mask returns the first True).
+                answer_pos = (labels != IGNORE_INDEX).int().argmax(dim=1) - 1
+                # A target token at position 0 would wrap to -1 and silently
+                # gather the logits of the last position instead.
+                assert (answer_pos >= 0).all(), (
+                    'Found a target token at position 0; cannot gather the '
+                    'logits preceding it.')
+
+                # Gather the A, B, C and D logits for the whole batch with a single
+                # indexing op and keep the predictions on device.
+                batch_idx = torch.arange(logits.size(0), device=logits.device)
+                abcd_logits = logits[batch_idx, answer_pos][:, abcd_idx]
+                preds.append(abcd_logits.argmax(dim=-1))
+
+                # Extract the ground truth labels and map them to choices 0..3.
+                answer_ids = labels[labels != IGNORE_INDEX].view(-1, 2)[:, 0]
+                refs.append(
+                    (answer_ids.unsqueeze(1) == abcd_idx).int().argmax(dim=1))
+                loss_mmlu += loss.detach()
+
+        # Sync the accumulated predictions and references to host once per eval
+        # instead of once per example.
+        preds = torch.cat(preds).cpu().tolist()
+        refs = torch.cat(refs).cpu().tolist()
 
         # Extract results by subject.
-        results = {'mmlu_loss': loss_mmlu / len(data_loader)}
-        subject = self.mmlu_dataset['subject']
+        results = {'mmlu_loss': (loss_mmlu / len(data_loader)).item()}
+        subject = self.mmlu_subjects
         subjects = {s: {'refs': [], 'preds': []} for s in set(subject)}
         for s, p, r in zip(subject, preds, refs):
             subjects[s]['preds'].append(p)
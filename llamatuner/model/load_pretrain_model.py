@@ -189,10 +189,12 @@ def load_model_tokenizer(
 
     # Instantiate tokenizer.
     logger.info('Loading tokenizer...')
+    # Use the fast (Rust) tokenizer: it releases the GIL and encodes batched
+    # inputs in parallel, and SupervisedDataset requires it.
     tokenizer = AutoTokenizer.from_pretrained(
         args.model_name_or_path,
         padding_side='right',
-        use_fast=False,
+        use_fast=True,
         model_max_length=args.model_max_length,
         tokenizer_type='llama' if 'llama' in args.model_name_or_path else None,
         **config_kwargs,
@@ -78,13 +78,16 @@ class PromptTemplate(object):
         prefix = prefix + self.sep if prefix else ''  # add separator for non-empty prefix
         history = history if (history and self.use_history) else []
         history = history + [(query, '<dummy>')]
+        # Use the precompiled template pieces: plain concatenation avoids
+        # re-parsing the format string on every turn.
+        head, tail = self._prompt_head, self._prompt_tail
         convs = []
         for turn_idx, (user_query, bot_resp) in enumerate(history):
             if turn_idx == 0:
-                convs.append(prefix + self.prompt.format(query=user_query))
+                convs.append(prefix + head + user_query + tail)
                 convs.append(bot_resp)
             else:
-                convs.append(self.sep + self.prompt.format(query=user_query))
+                convs.append(self.sep + head + user_query + tail)
                 convs.append(bot_resp)
         return convs[:-1]  # drop last
 
@@ -109,6 +112,9 @@ class PromptTemplate(object):
         self.prompt = prompt
         self.sep = sep
         self.use_history = use_history
+        # Specialize the prompt once so formatting a turn is two string
+        # concatenations instead of a str.format call.
+        self._prompt_head, _, self._prompt_tail = prompt.partition('{query}')
 
     def __post_init__(self):
         """Initializes the instance of the class."""
@@ -43,7 +43,15 @@ def generate_response(
     # Convert the query and history into input IDs
     input_text = prompt_template.get_prompt(query, history, prefix)
     inputs = tokenizer(input_text, return_tensors='pt')
-    inputs = {k: v.to(model.device) for k, v in inputs.items()}
+    if torch.cuda.is_available():
+        # Pinned host memory makes the host-to-device copy asynchronous, so
+        # the generate thread is not stalled on long prompts.
+        inputs = {
+            k: v.pin_memory().to(model.device, non_blocking=True)
+            for k, v in inputs.items()
+        }
+    else:
+        inputs = {k: v.to(model.device) for k, v in inputs.items()}
 
     # Create a TextIteratorStreamer object to stream the response from the model
     streamer = TextIteratorStreamer(tokenizer,